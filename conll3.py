@@ -281,8 +281,10 @@ def conll2tree(conllstring):
 	return tree
 
 
-def conllFile2trees(path, encoding="utf-8"):
-	trees=[]
+def conllFile2treesIter(path, encoding="utf-8"):
+	"""
+	path to a conll file -> iterator over its trees, read one at a time
+	"""
 	with open(path) as f:
 		conlltext=""
 		for li in f:
@@ -290,16 +292,14 @@ def conllFile2trees(path, encoding="utf-8"):
 			if li:
 				conlltext+=li+"\n"
 			else: # emptyline, sentence is finished
-				tree=conll2tree(conlltext)
-				# print(tree)
-				trees+=[tree]
-				del tree
+				yield conll2tree(conlltext)
 				conlltext=""
-		f.close()
 		if conlltext.strip(): # last tree may not be followed by empty line
-			tree=conll2tree(conlltext)
-			trees+=[tree]
-		return trees
+			yield conll2tree(conlltext)
+
+
+def conllFile2trees(path, encoding="utf-8"):
+	return list(conllFile2treesIter(path, encoding))
 
 
 def trees2conllFile(trees, outfile, sentencefeatures=True, columns="u"): # changed default from 10 to u!
@@ -457,20 +457,24 @@ def unpunctATree_2(tree):
 	return t
 
 
+def conllFolder2treesIter_unpuncted(folder):
+	"""
+	path to folder containing files in .conllu -> iterator over the trees
+
+	punctuations are removed, only one tree is in memory at a time
+	"""
+	fichiers = glob.glob(folder+"*.conllu")
+	for fichier in fichiers:
+		for t in conllFile2treesIter(fichier):
+			yield unpunctATree_2(t)
+
 def conllFolder2trees_unpuncted(folder):
 	"""
 	path to folder containing files in .conllu -> list of trees
 
 	punctuations are removed
 	"""
-	fichiers = glob.glob(folder+"*.conllu")
-	trees = list()
-	for fichier in fichiers:
-		subtrees = conllFile2trees(fichier)
-		for t in subtrees:
-			tree = unpunctATree_2(t)
-			trees.append(tree)
-	return trees
+	return list(conllFolder2treesIter_unpuncted(folder))
 
 def UD_unpunct(folder, outfolder):
 	treebanks = glob.glob(folder)
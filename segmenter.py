@@ -2,128 +2,326 @@
 Script used for the segmentation of czech corpora into
 Linear Dependency Segments
 """
+import collections
 import conll3
-import pandas as pd
-import re
+import csv
+import itertools
+import numpy as np
+from numba import njit, prange
 
-def is_finite_verb(tree, i):
+def get_govs(tree, refresh=False):
     """
-    Are considered finite verbs tokens with xpos:
-    - Vc
-    - Vs
-    - VB
-    - Vi
-    - And Vp when their parent is not an AUX (otherwise the auxiliary is head of the clause)
+    Given a tree returns a dict id -> id of the governor
+    The dict is cached on the tree (tree._gov) for syntactically_linked_ngrams_1/2, which are
+    called once per clause. tree_to_arrays (so clause_segmentation) always refreshes it:
+    after editing the governors of a tree, segment it again or call get_govs(tree, refresh=True)
     """
-    if tree[i]["xpos"][:2] in ["Vc", "Vs", "VB", "Vi"]:
-        return True
-    elif tree[i]["xpos"][:2] == "Vp":
-        idgov, _ = tree.idgovRel(i)
-        if idgov == 0:
-            return True
-        else:
-            upos_gov = tree[idgov]["tag"]
-            if upos_gov != "AUX":
-                return True
-            else:
-                return False
-    elif tree[i]["tag"] == "AUX":
-        for k in tree[i]['kids']:
-            if tree[k]["xpos"][:2] == "Vp":
-                return True
-        return False
-    else:
-        return False
-
-def is_finite_verb_or_sconj(tree,i):
+    gov = None if refresh else getattr(tree, "_gov", None)
+    if gov is None:
+        # same as tree.idgovRel(i)[0], without building the list of (idgov, rel)
+        gov = {i: next(iter(node["gov"])) for i, node in tree.items()}
+        tree._gov = gov
+    return gov
+
+# xpos (2 first characters) of the tokens that are always finite verbs
+FINITE_XPOS = frozenset(("Vc", "Vs", "VB", "Vi"))
+
+# xpos (2 first characters) and upos are encoded as int8 for the compiled functions, -1 for anything else
+# the xpos code tells which rule of finite_verb_flags applies, so all the finite xpos share one code
+FINITE = 0
+VP = 1
+XPOS_CODES = dict.fromkeys(FINITE_XPOS, FINITE)
+XPOS_CODES["Vp"] = VP
+TAG_CODES = {"AUX": 0, "SCONJ": 1}
+AUX = TAG_CODES["AUX"]
+SCONJ = TAG_CODES["SCONJ"]
+
+TreeArrays = collections.namedtuple("TreeArrays", ["xpos_code", "tag_code", "gov", "kids_flat", "kids_off"])
+
+@njit(cache=True)
+def build_csr(gov):
     """
-    Clauses begin with a finite verbe (not preceded by sconj) or a SCONJ that governs a finite verb
+    Kids of every token in CSR format, built from the governors (counting sort)
+    in:
+    - ids of the governors, array indexed by id: 0 for the root, -1 for the ids that aren't tokens,
+      any other governor must be a token of the tree (checked by tree_to_arrays)
+    out:
+    - kids_flat, kids_off: kids of i are kids_flat[kids_off[i]:kids_off[i+1]] (int32, in id order)
     """
-    if tree[i]["tag"] == "SCONJ":
-        kids = tree[i]["kids"]
-        for k in kids:
-            if is_finite_verb(tree, k):
-                return True
-        return False
-    elif is_finite_verb(tree,i):
-        idgov, _ = tree.idgovRel(i)
-        if idgov == 0:
-            return True
-        elif tree[idgov]["tag"] == "SCONJ":
-            return False
-        else:
-            return True
+    n = len(gov)
+    kids_off = np.zeros(n+1, dtype=np.int32)
+    for k in range(1, n):
+        if gov[k] > 0:
+            kids_off[gov[k]+1] += 1
+    for i in range(n):
+        kids_off[i+1] += kids_off[i]
+    kids_flat = np.empty(kids_off[n], dtype=np.int32)
+    cursor = kids_off[:n].copy()
+    for k in range(1, n):
+        if gov[k] > 0:
+            kids_flat[cursor[gov[k]]] = k
+            cursor[gov[k]] += 1
+    return kids_flat, kids_off
+
+def tree_to_arrays(tree):
+    """
+    Converts a tree into parallel arrays indexed by token id (index 0 is the root)
+    - xpos_code: code of the first two characters of the xpos (int8, see XPOS_CODES)
+    - tag_code: code of the upos (int8, see TAG_CODES)
+    - gov: id of the governor (int32)
+    - kids_flat, kids_off: kids of i are kids_flat[kids_off[i]:kids_off[i+1]] (int32, see build_csr)
+    in:
+    - object of type conll3.Tree, ids are integers 1..n
+    out:
+    - TreeArrays
+    raises ValueError when a governor is neither 0 nor a token of the tree
+    (the compiled functions index the arrays with the governors without checking them)
+    """
+    gov_dict = get_govs(tree, refresh=True)
+    for i, idgov in gov_dict.items():
+        if idgov != 0 and idgov not in tree:
+            raise ValueError("token %s has governor %s, which isn't in the tree" % (i, idgov))
+    n = max(tree, default=0) + 1
+    xpos_code = [-1] * n
+    tag_code = [-1] * n
+    gov = [-1] * n
+    for i, node in tree.items():
+        xpos_code[i] = XPOS_CODES.get(node["xpos"][:2], -1)
+        tag_code[i] = TAG_CODES.get(node["tag"], -1)
+        gov[i] = gov_dict[i]
+    gov = np.array(gov, dtype=np.int32)
+    kids_flat, kids_off = build_csr(gov)
+    return TreeArrays(np.array(xpos_code, dtype=np.int8), np.array(tag_code, dtype=np.int8), gov, kids_flat, kids_off)
+
+def tree_forms(tree):
+    """
+    Forms of the tokens in an object array indexed by id (index 0 is the root, "")
+    forms[clause] gives the forms of a clause in one gather
+    """
+    forms = np.full(max(tree, default=0)+1, "", dtype=object)
+    forms[list(tree)] = [node["t"] for node in tree.values()]
+    return forms
+
+def is_finite_verb(flags, i):
+    """
+    Is token i a finite verb (rules in finite_verb_flags)
+    in:
+    - flags = finite_verb_flags(arrays), computed once per tree
+    """
+    is_fv, _ = flags
+    return bool(is_fv[i])
+
+def is_finite_verb_or_sconj(flags, i):
+    """
+    Does a clause begin at token i (rules in finite_verb_flags)
+    in:
+    - flags = finite_verb_flags(arrays), computed once per tree
+    """
+    _, is_fv_or_sconj = flags
+    return bool(is_fv_or_sconj[i])
 
 def get_descendants(tree, i):
     """
-    Given a tree and an id finds all descendants (recursive)
+    Given a tree and an id finds all descendants (iterative, depth first)
+    The kids are read from the TreeArrays of the tree (see tree_to_arrays), tree.addkids() isn't needed
     in:
     - object of type conll3.Tree
     out:
     [1,3,4]
     """
+    arrays = tree_to_arrays(tree)
+    kids_flat, kids_off = arrays.kids_flat.tolist(), arrays.kids_off.tolist()
     descendants = []
-    children = tree.get_kids(i)
-    descendants.extend(children)
-    if children:
-        for c in children:
-            x = get_descendants(tree, c)
-            if x:
-                descendants.extend(x)
+    stack = [i]
+    while stack:
+        n = stack.pop()
+        for c in kids_flat[kids_off[n]:kids_off[n+1]]:
+            descendants.append(c)
+            stack.append(c)
     return descendants
 
-def get_descendants_until_Fin_Verb(tree, i):
+@njit(cache=True)
+def finite_verb_flags(arrays):
     """
-    Given a tree and an id finds all descendants (recursive).
+    Computes is_finite_verb and is_finite_verb_or_sconj for every token of the tree
+
+    Are considered finite verbs tokens with xpos:
+    - Vc
+    - Vs
+    - VB
+    - Vi
+    - And Vp when their parent is not an AUX (otherwise the auxiliary is head of the clause)
+    - And AUX that govern a Vp
+
+    Clauses begin with a finite verbe (not preceded by sconj) or a SCONJ that governs a finite verb
+    in:
+    - TreeArrays
+    out:
+    - bool array indexed by id (is_finite_verb)
+    - bool array indexed by id (is_finite_verb_or_sconj)
+    """
+    xpos_code, tag_code, gov, kids_flat, kids_off = arrays
+    n = len(gov)
+
+    # AUX governing a Vp, found from the Vp side so that the kids of the AUX aren't scanned
+    aux_has_vp_kid = np.zeros(n, dtype=np.bool_)
+    for k in range(1, n):
+        if xpos_code[k] == VP and gov[k] > 0 and tag_code[gov[k]] == AUX:
+            aux_has_vp_kid[gov[k]] = True
+
+    is_fv = np.zeros(n, dtype=np.bool_)
+    for i in range(1, n):
+        if xpos_code[i] == FINITE:
+            is_fv[i] = True
+        elif xpos_code[i] == VP:
+            is_fv[i] = gov[i] == 0 or tag_code[gov[i]] != AUX
+        else:
+            is_fv[i] = aux_has_vp_kid[i]
+
+    is_fv_or_sconj = np.zeros(n, dtype=np.bool_)
+    for i in range(1, n):
+        if tag_code[i] == SCONJ:
+            for k in kids_flat[kids_off[i]:kids_off[i+1]]:
+                if is_fv[k]:
+                    is_fv_or_sconj[i] = True
+                    break
+        elif is_fv[i]:
+            is_fv_or_sconj[i] = gov[i] == 0 or tag_code[gov[i]] != SCONJ
+    return is_fv, is_fv_or_sconj
+
+@njit(cache=True)
+def get_descendants_until_Fin_Verb(is_fv_or_sconj, kids_flat, kids_off, i):
+    """
+    Given an id finds all descendants (iterative, depth first).
     Stop when you encounter a Finite Verb
     This is used to segment into clauses
 
     in:
-    - object of type conll3.Tree
+    - bool array indexed by id (is_finite_verb_or_sconj, see finite_verb_flags)
+    - kids in CSR format (see tree_to_arrays)
     out:
-    [1,3,4]
+    array([1,3,4])
     """
-    descendants = []
-    children = tree.get_kids(i)
-    children = [c for c in children if not is_finite_verb_or_sconj(tree, c)]
-    descendants.extend(children)
-    if children:
-        for c in children:
-            x = get_descendants_until_Fin_Verb(tree, c)
-            if x:
-                x = [z for z in x if not is_finite_verb_or_sconj(tree, z)]
-                descendants.extend(x)
-    return descendants
+    descendants = np.empty(len(kids_flat), dtype=np.int32)
+    stack = np.empty(len(kids_flat)+1, dtype=np.int32)
+    stack[0] = i
+    top = 1
+    count = 0
+    while top:
+        top -= 1
+        n = stack[top]
+        for c in kids_flat[kids_off[n]:kids_off[n+1]]:
+            if not is_fv_or_sconj[c]:
+                descendants[count] = c
+                count += 1
+                stack[top] = c
+                top += 1
+    return descendants[:count]
+
+@njit(cache=True)
+def clause_segment(arrays):
+    """
+    Compiled clause segmentation of a tree
+    in:
+    - TreeArrays
+    out:
+    - clause_flat, clause_off: clause k is clause_flat[clause_off[k]:clause_off[k+1]] (sorted ids)
+    """
+    _, is_fv_or_sconj = finite_verb_flags(arrays)
+    n = len(arrays.gov)
+    # a token belongs to the clause of its closest finite verb ancestor at most
+    clause_flat = np.empty(n, dtype=np.int32)
+    clause_off = np.zeros(n+1, dtype=np.int32)
+    # the tokens of the current clause are marked in mask, reading it in order gives the sorted clause
+    mask = np.zeros(n, dtype=np.bool_)
+    n_clauses = 0
+    end = 0
+    for root in range(1, n):
+        if is_fv_or_sconj[root]:
+            touched = get_descendants_until_Fin_Verb(is_fv_or_sconj, arrays.kids_flat, arrays.kids_off, root)
+            mask[root] = True
+            lo = hi = root
+            for c in touched:
+                mask[c] = True
+                lo = min(lo, c)
+                hi = max(hi, c)
+            for c in range(lo, hi+1):
+                if mask[c]:
+                    clause_flat[end] = c
+                    end += 1
+            # only the touched positions need to be cleared
+            mask[root] = False
+            for c in touched:
+                mask[c] = False
+            n_clauses += 1
+            clause_off[n_clauses] = end
+    return clause_flat[:end], clause_off[:n_clauses+1]
 
 
 def clause_segmentation(tree):
-    clauses = []
-    tree.addkids()
-    fin_verbs = [i for i in tree if is_finite_verb_or_sconj(tree, i)]
-    if not fin_verbs:
-        return []
-    else:
-        for root in fin_verbs:
-            descendants = get_descendants_until_Fin_Verb(tree, root)
-            clause = sorted(descendants+[root])
-            clauses.append(clause)
-        return clauses
-
-def is_syntactic_bigram(tree, id_1, id_2):
-    idgov_1, _ = tree.idgovRel(id_1)
-    if idgov_1 == id_2:
-        return True
-    idgov_2, _ = tree.idgovRel(id_2)
-    if idgov_2 == id_1:
-        return True
-    return False
+    clause_flat, clause_off = clause_segment(tree_to_arrays(tree))
+    return [clause_flat[clause_off[k]:clause_off[k+1]].tolist() for k in range(len(clause_off)-1)]
+
+def is_syntactic_bigram(gov, id_1, id_2):
+    """
+    Is one of the two tokens the governor of the other
+    in:
+    - ids of the governors: dict id -> governor (see get_govs) or array indexed by id (see tree_to_arrays)
+    """
+    return gov[id_1] == id_2 or gov[id_2] == id_1
+
+# compiled version of is_syntactic_bigram for linked_ngrams_offsets
+_is_syntactic_bigram_nb = njit(cache=True)(is_syntactic_bigram)
 
 def is_complete(tree):
-    for i in tree:
-        idgov, _ = tree.idgovRel(i)
-        if idgov == -1:
-            return False
-    return True
+    """
+    A tree is complete when every token has a governor (stops at the first one without)
+    Read from the tree itself on every call, so edits to the governors are seen
+    """
+    return all(next(iter(node["gov"])) != -1 for node in tree.values())
+
+@njit(cache=True)
+def linked_ngrams_offsets(gov, clause, method):
+    """
+    Compiled segment_spans (method 1 or 2) for the batch path (see segment_stacked)
+    out:
+    - offsets: segment k is clause[offsets[k]:offsets[k+1]]
+    """
+    # len(clause)+1 offsets at most, plus one so that an empty clause stays in bounds
+    offsets = np.empty(len(clause)+2, dtype=np.int32)
+    offsets[0] = 0
+    n_segments = 0
+    for k in range(1, len(clause)):
+        if (method == 2 and clause[k-1]+1 != clause[k]) or not _is_syntactic_bigram_nb(gov, clause[k], clause[k-1]):
+            n_segments += 1
+            offsets[n_segments] = k
+    offsets[n_segments+1] = len(clause)
+    return offsets[:n_segments+2]
+
+
+def segment_spans(gov, clause, method):
+    """
+    LDS of a clause as (start, end) offsets: segment k is clause[start:end]
+    Plain loop: on clauses of a few tokens it is faster than calling the compiled
+    linked_ngrams_offsets, which is used for whole batches of trees (see segment_stacked)
+    in:
+    - dict id -> id of the governor (see get_govs)
+    - clause, list of ids
+    - method: 1 or 2 (see syntactically_linked_ngrams_1 and syntactically_linked_ngrams_2)
+    out:
+    [(0, 2), (2, 3), (3, 5)]
+    """
+    if len(clause) == 0:
+        raise IndexError("a clause has at least one token")
+    spans = []
+    start = 0
+    for k in range(1, len(clause)):
+        previous, current = clause[k-1], clause[k]
+        if (method == 2 and previous+1 != current) or not is_syntactic_bigram(gov, current, previous):
+            spans.append((start, k))
+            start = k
+    spans.append((start, len(clause)))
+    return spans
 
 
 def syntactically_linked_ngrams_1(tree, clause):
@@ -131,16 +329,9 @@ def syntactically_linked_ngrams_1(tree, clause):
 
     segments are cut off when one word isn't linked to its right neighbour
     in the linear order of the clause
+    The governors are the ones cached by clause_segmentation (see get_govs)
     """
-    # initialization
-    segments = [[clause[0]]]
-    for i in range(1, len(clause)):
-        # print(i)
-        if is_syntactic_bigram(tree, clause[i], clause[i-1]):
-            segments[-1].append(clause[i])
-        else:
-            segments.append([clause[i]])
-    return segments
+    return [clause[start:end] for start, end in segment_spans(get_govs(tree), clause, 1)]
 
 
 def syntactically_linked_ngrams_2(tree, clause):
@@ -148,15 +339,145 @@ def syntactically_linked_ngrams_2(tree, clause):
 
     segments are cut off when one word isn't linked to its right neighbour
     in the linear order of the sentence
+    The governors are the ones cached by clause_segmentation (see get_govs)
     """
-    # initialization
-    segments = [[clause[0]]]
-    for i in range(1, len(clause)):
-        if clause[i-1]+1 == clause[i] and is_syntactic_bigram(tree, clause[i], clause[i-1]):
-            segments[-1].append(clause[i])
-        else:
-            segments.append([clause[i]])
-    return segments
+    return [clause[start:end] for start, end in segment_spans(get_govs(tree), clause, 2)]
+
+
+def stack_arrays(trees_arrays):
+    """
+    Concatenates the TreeArrays of several trees
+    out:
+    - TreeArrays: xpos_code, tag_code, gov of tree t are at [tree_off[t]:tree_off[t+1]],
+      kids_off at [tree_off[t]+t:tree_off[t+1]+t+1] and kids_flat at [kids_start[t]:kids_start[t+1]]
+    - tree_off
+    - kids_start
+    """
+    dtypes = (np.int8, np.int8, np.int32, np.int32, np.int32)
+    stacked = TreeArrays(*[np.concatenate([np.empty(0, dtype=dtype)] + [arrays[f] for arrays in trees_arrays])
+                           for f, dtype in enumerate(dtypes)])
+    tree_off = np.zeros(len(trees_arrays)+1, dtype=np.int64)
+    np.cumsum([len(arrays.gov) for arrays in trees_arrays], out=tree_off[1:])
+    kids_start = np.zeros(len(trees_arrays)+1, dtype=np.int64)
+    np.cumsum([len(arrays.kids_flat) for arrays in trees_arrays], out=kids_start[1:])
+    return stacked, tree_off, kids_start
+
+@njit(cache=True, parallel=True)
+def segment_stacked(stacked, tree_off, kids_start):
+    """
+    Compiled clause + LDS segmentation of stacked trees (see stack_arrays), one tree per thread
+    out:
+    - clause_flat, clause_off: clause k is clause_flat[clause_off[k]:clause_off[k+1]]
+    - tree_clause_off: clauses of tree t are tree_clause_off[t] to tree_clause_off[t+1]
+    - lds_1, lds_2: aligned with clause_flat, True where a segment starts (method 1 / method 2)
+    """
+    xpos_code, tag_code, gov, kids_flat, kids_off = stacked
+    n_trees = len(tree_off)-1
+    # each tree writes in its own slice [tree_off[t]:tree_off[t+1]] of the buffers
+    clause_buf = np.empty(tree_off[-1], dtype=np.int32)
+    clause_end_buf = np.empty(tree_off[-1], dtype=np.int32)
+    lds_1_buf = np.zeros(tree_off[-1], dtype=np.bool_)
+    lds_2_buf = np.zeros(tree_off[-1], dtype=np.bool_)
+    n_tokens = np.zeros(n_trees, dtype=np.int64)
+    n_clauses = np.zeros(n_trees, dtype=np.int64)
+    for t in prange(n_trees):
+        a, b = tree_off[t], tree_off[t+1]
+        arrays = TreeArrays(xpos_code[a:b], tag_code[a:b], gov[a:b],
+                            kids_flat[kids_start[t]:kids_start[t+1]], kids_off[a+t:b+t+1])
+        clause_flat, clause_off = clause_segment(arrays)
+        clause_buf[a:a+len(clause_flat)] = clause_flat
+        clause_end_buf[a:a+len(clause_off)-1] = clause_off[1:]
+        for k in range(len(clause_off)-1):
+            clause = clause_flat[clause_off[k]:clause_off[k+1]]
+            for start in linked_ngrams_offsets(arrays.gov, clause, 1)[:-1]:
+                lds_1_buf[a+clause_off[k]+start] = True
+            for start in linked_ngrams_offsets(arrays.gov, clause, 2)[:-1]:
+                lds_2_buf[a+clause_off[k]+start] = True
+        n_tokens[t] = len(clause_flat)
+        n_clauses[t] = len(clause_off)-1
+
+    # concatenate the slices
+    token_start = np.zeros(n_trees+1, dtype=np.int64)
+    token_start[1:] = np.cumsum(n_tokens)
+    tree_clause_off = np.zeros(n_trees+1, dtype=np.int64)
+    tree_clause_off[1:] = np.cumsum(n_clauses)
+    clause_flat = np.empty(token_start[-1], dtype=np.int32)
+    clause_off = np.zeros(tree_clause_off[-1]+1, dtype=np.int64)
+    lds_1 = np.empty(token_start[-1], dtype=np.bool_)
+    lds_2 = np.empty(token_start[-1], dtype=np.bool_)
+    for t in range(n_trees):
+        a = tree_off[t]
+        s, e = token_start[t], token_start[t+1]
+        clause_flat[s:e] = clause_buf[a:a+e-s]
+        lds_1[s:e] = lds_1_buf[a:a+e-s]
+        lds_2[s:e] = lds_2_buf[a:a+e-s]
+        clause_off[tree_clause_off[t]+1:tree_clause_off[t+1]+1] = clause_end_buf[a:a+n_clauses[t]] + s
+    return clause_flat, clause_off, tree_clause_off, lds_1, lds_2
+
+
+def lds_spans(lds, clause_off):
+    """
+    Spans of the segments found by segment_stacked
+    in:
+    - lds: bool array aligned with clause_flat, True where a segment starts
+    - clause_off
+    out:
+    - spans: (start, end) of every segment, relative to its clause (see segment_spans)
+    - clause_seg: spans of clause k are spans[clause_seg[k]:clause_seg[k+1]]
+    """
+    # every clause starts a segment, and ends where the next one starts
+    seg = np.append(np.flatnonzero(lds), clause_off[-1])
+    clause_seg = np.searchsorted(seg, clause_off)
+    seg_clause_start = clause_off[np.searchsorted(clause_off, seg[:-1], side="right")-1]
+    starts = seg[:-1] - seg_clause_start
+    ends = seg[1:] - seg_clause_start
+    return list(zip(starts.tolist(), ends.tolist())), clause_seg.tolist()
+
+def segment_trees(trees):
+    """
+    Clause segmentation and LDS segmentation (methods 1 and 2) of a list of trees,
+    the trees are segmented in parallel (see segment_stacked)
+    in:
+    - list of objects of type conll3.Tree (complete, see is_complete)
+    out:
+    - for each tree a list with, for each clause, (clause, spans method 1, spans method 2)
+      the segments are given as spans of the clause (see segment_spans)
+    """
+    trees_arrays = []
+    for tree in trees:
+        trees_arrays.append(tree_to_arrays(tree))
+    clause_flat, clause_off, tree_clause_off, lds_1, lds_2 = segment_stacked(*stack_arrays(trees_arrays))
+    spans_1, clause_seg_1 = lds_spans(lds_1, clause_off)
+    spans_2, clause_seg_2 = lds_spans(lds_2, clause_off)
+    clause_flat, clause_off, tree_clause_off = clause_flat.tolist(), clause_off.tolist(), tree_clause_off.tolist()
+    results = []
+    for t in range(len(trees)):
+        clauses = []
+        for k in range(tree_clause_off[t], tree_clause_off[t+1]):
+            clauses.append((clause_flat[clause_off[k]:clause_off[k+1]],
+                            spans_1[clause_seg_1[k]:clause_seg_1[k+1]],
+                            spans_2[clause_seg_2[k]:clause_seg_2[k+1]]))
+        results.append(clauses)
+    return results
+
+def iter_segmentations(trees, batch_size=10000):
+    """
+    Segments an iterable of trees batch by batch (see segment_trees),
+    only batch_size trees are in memory at a time
+    in:
+    - iterable of objects of type conll3.Tree
+    out:
+    - iterator over (t_id, tree, clauses) for the complete trees (see is_complete),
+      t_id is the position of the tree in trees and clauses is as in segment_trees
+    """
+    trees = enumerate(trees)
+    while True:
+        batch = list(itertools.islice(trees, batch_size))
+        if not batch:
+            return
+        batch = [(t_id, t) for t_id, t in batch if is_complete(t)]
+        for (t_id, t), clauses in zip(batch, segment_trees([t for _, t in batch])):
+            yield t_id, t, clauses
 
 
 
@@ -210,69 +531,45 @@ def syntactically_linked_ngrams_2(tree, clause):
 # # folder with the conllu files
 # input_folder = "../czech-sud-merged/"
 
-# # create the list of trees
-# new_trees = conll3.conllFolder2trees_unpuncted(input_folder)
+# # the trees are read from the files and segmented (in parallel) by batches, see iter_segmentations
+# # for each complete tree: list of (clause, spans method 1, spans method 2)
 
-# # method 1 :
+# # method 1 and method 2 are written in the same pass over the trees
 # output_name_1 = "segmentation_results_sud_method1_v2_pdt_fictree.tsv"
-# results = []
-# clause_c = 0
-# segment_c = 0
-
-# for t_id, t in enumerate(new_trees):
-#     if not is_complete(t):
-#         continue
-#     results.append(["sentence", t_id, "None", "None", t.sentence()])
-#     clauses = clause_segmentation(t)
-
-#     # this will print sentences with no clauses
-#     if not clauses:
-#         print(t.sentence())
-    
-#     for c in clauses:
-#         results.append(["clause", t_id, clause_c, "None", " ".join([t[x]["t"] for x in c])])
-#         # syntactically linked bigrams (neighbours in clause)
-        
-#         segments = syntactically_linked_ngrams_1(t, c)
-#         # print(segments)
-#         for s in segments:
-#             results.append(["segment", t_id, clause_c, segment_c, " ".join([t[x]["t"] for x in s])])
-#             segment_c += 1 
-#         clause_c += 1
-
-
-# # output the results of method 1
-# df = pd.DataFrame.from_records(results, columns=["type", "sentence_id", "clause_id", "segment_id", "text"])
-# df.to_csv(output_name_1, sep="\t", index=False)
-
-# # method 2 
 # output_name_2 = "segmentation_results_sud_method2_v2_pdt_fictree.tsv"
-# results = []
+# header = ["type", "sentence_id", "clause_id", "segment_id", "text"]
 # clause_c = 0
-# segment_c = 0
-
-# for t_id, t in enumerate(new_trees):
-#     if not is_complete(t):
-#         continue
-#     results.append(["sentence", t_id, "None", "None", t.sentence()])
-#     clauses = clause_segmentation(t)
-
-#     # this will print sentences with no clauses
-#     if not clauses:
-#         print(t.sentence())
-    
-#     for c in clauses:
-#         results.append(["clause", t_id, clause_c, "None", " ".join([t[x]["t"] for x in c])])
-#         # syntactically linked bigrams (neighbours in clause)
-        
-#         segments = syntactically_linked_ngrams_2(t, c)
-#         # print(segments)
-#         for s in segments:
-#             results.append(["segment", t_id, clause_c, segment_c, " ".join([t[x]["t"] for x in s])])
-#             segment_c += 1 
-#         clause_c += 1
-
-
-# # output the results of method 2
-# df = pd.DataFrame.from_records(results, columns=["type", "sentence_id", "clause_id", "segment_id", "text"])
-# df.to_csv(output_name_2, sep="\t", index=False)
\ No newline at end of file
+# segment_c_1 = 0
+# segment_c_2 = 0
+
+# # the rows are written as they are produced
+# with open(output_name_1, "w", newline="") as f_1, open(output_name_2, "w", newline="") as f_2:
+#     writer_1 = csv.writer(f_1, delimiter="\t", lineterminator="\n")
+#     writer_2 = csv.writer(f_2, delimiter="\t", lineterminator="\n")
+#     writer_1.writerow(header)
+#     writer_2.writerow(header)
+
+#     for t_id, t, clauses in iter_segmentations(conll3.conllFolder2treesIter_unpuncted(input_folder)):
+#         forms = tree_forms(t)
+#         row = ["sentence", t_id, "None", "None", t.sentence()]
+#         writer_1.writerow(row)
+#         writer_2.writerow(row)
+
+#         # this will print sentences with no clauses
+#         if not clauses:
+#             print(t.sentence())
+
+#         for c, spans_1, spans_2 in clauses:
+#             clause_forms = forms[c]
+#             row = ["clause", t_id, clause_c, "None", " ".join(clause_forms)]
+#             writer_1.writerow(row)
+#             writer_2.writerow(row)
+#             # syntactically linked bigrams (neighbours in clause), method 1
+#             for start, end in spans_1:
+#                 writer_1.writerow(["segment", t_id, clause_c, segment_c_1, " ".join(clause_forms[start:end])])
+#                 segment_c_1 += 1
+#             # syntactically linked bigrams (neighbours in clause), method 2
+#             for start, end in spans_2:
+#                 writer_2.writerow(["segment", t_id, clause_c, segment_c_2, " ".join(clause_forms[start:end])])
+#                 segment_c_2 += 1
+#             clause_c += 1